@@ -9,23 +9,20 @@ Usage:
 
 import argparse
 import sys
-import os
 from pathlib import Path
 from solver import (
     load_config,
+    load_config_cached,
     generate_multi_block_schedule,
+    parse_solver_parameters,
     SEPARATOR
 )
 
 
 def cmd_generate(args):
     """Generate on-call schedule."""
-    if not os.path.exists(args.config):
-        print(f"❌ Config file not found: {args.config}")
-        sys.exit(1)
-    
     print(f"📋 Loading config from: {args.config}")
-    config = load_config(args.config)
+    config = load_config_cached(args.config) if args.cache else load_config(args.config)
     
     # Override output directory if specified
     if args.output_dir:
@@ -51,14 +48,10 @@ def cmd_generate(args):
 
 def cmd_validate(args):
     """Validate configuration file."""
-    if not os.path.exists(args.config):
-        print(f"❌ Config file not found: {args.config}")
-        sys.exit(1)
-    
     print(f"📋 Validating config: {args.config}")
     
     try:
-        config = load_config(args.config)
+        config = load_config_cached(args.config) if args.cache else load_config(args.config)
         
         # Basic validation
         errors = []
@@ -103,6 +96,14 @@ def cmd_validate(args):
             if 'max_weekends_per_engineer' not in constraints:
                 errors.append("'constraints.max_weekends_per_engineer' is required")
             
+            # Validate CP-SAT parameter overrides
+            solver_params = (config.get('solver') or {}).get('parameters')
+            if solver_params is not None:
+                try:
+                    parse_solver_parameters(solver_params)
+                except ValueError as e:
+                    errors.append(str(e))
+            
             # Capacity check (per block)
             if not errors:
                 num_engineers = len(team)
@@ -134,6 +135,8 @@ def cmd_validate(args):
             print(f"\n✅ Configuration is valid!")
             sys.exit(0)
     
+    except FileNotFoundError:
+        raise  # Reported by main()
     except Exception as e:
         print(f"\n❌ Error loading config: {e}")
         sys.exit(1)
@@ -160,16 +163,28 @@ Examples:
                                   help='Path to config file (default: config.yaml)')
     parser_generate.add_argument('--output-dir', '-o',
                                   help='Output directory for generated files')
+    parser_generate.add_argument('--cache', action='store_true',
+                                  help='Reuse a parsed copy of the config stored next to it (<config>.cache.json)')
     parser_generate.set_defaults(func=cmd_generate)
     
     # Validate command
     parser_validate = subparsers.add_parser('validate', help='Validate configuration')
     parser_validate.add_argument('--config', '-c', default='config.yaml',
                                   help='Path to config file (default: config.yaml)')
+    parser_validate.add_argument('--cache', action='store_true',
+                                  help='Reuse a parsed copy of the config stored next to it (<config>.cache.json)')
     parser_validate.set_defaults(func=cmd_validate)
     
     args = parser.parse_args()
-    args.func(args)
+    
+    # Loading the config is the existence check; no separate stat beforehand
+    try:
+        args.func(args)
+    except FileNotFoundError as e:
+        if e.filename != args.config:
+            raise
+        print(f"❌ Config file not found: {args.config}")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,21 +1,117 @@
 from ortools.sat.python import cp_model
-from datetime import datetime, timedelta
+from ortools.sat import sat_parameters_pb2
+from google.protobuf import json_format, text_format
+from datetime import date, datetime, timedelta
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import lru_cache
 import csv
+import io
+import json
 import os
-import yaml
+import numpy as np
 
 # Constants
 SEPARATOR = '=' * 60
 
+# CP-SAT parameters that differ from its defaults, for every solve; the config's
+# solver.parameters overrides them (and can set any other CP-SAT parameter)
+SOLVER_PARAMETERS = {
+    'num_search_workers': min(16, os.cpu_count() or 8),  # CP-SAT's 0 means every core, uncapped
+}
+
+# Give CP-SAT variables readable names (e.g. x_Alice_3_NP) for debugging model
+# dumps; the solver does not need them, so they are skipped by default
+DEBUG_NAMES = False
+
+# One calendar event; each line is preceded by the CRLF that ends the previous one
+VEVENT_TEMPLATE = (
+    '\r\nBEGIN:VEVENT'
+    '\r\nDTSTART:{start_str}'
+    '\r\nDTEND:{end_str}'
+    '\r\nSUMMARY:On-Call: {engineer} ({role_name})'
+    '\r\nDESCRIPTION:Engineer: {engineer}\\nRole: {role_name}'
+    '\r\nUID:{block_idx}-{week}-{role}-{day_name}@oncall'
+    '\r\nEND:VEVENT'
+)
+
 
 def load_config(config_path='config.yaml'):
     """Load configuration from YAML file."""
+    # Imported here so cached config loads and direct solver use skip PyYAML
+    import yaml
+    
+    # Prefer the libyaml-backed loader; fall back to pure Python if unavailable
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
     with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=loader)
+
+
+def load_config_cached(config_path='config.yaml'):
+    """
+    Load configuration, reusing a JSON copy of a previous parse.
+    
+    The parsed config is stored next to the YAML file as
+    <config_path>.cache.json together with the YAML file's modification
+    time, and is reparsed whenever that time changes. Unlike a pickle, a
+    stray or crafted cache file cannot run code when it is read.
+    """
+    cache_path = config_path + '.cache.json'
+    mtime_ns = os.stat(config_path).st_mtime_ns
+    
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached['mtime_ns'] == mtime_ns:
+            return cached['config']
+    except Exception:
+        pass  # Missing, corrupt or foreign cache: fall back to parsing
+    
+    config = load_config(config_path)
+    try:
+        # Only cache configs that survive JSON unchanged (not e.g. unquoted
+        # YAML dates or non-string keys)
+        text = json.dumps({'mtime_ns': mtime_ns, 'config': config})
+        if json.loads(text)['config'] == config:
+            with open(cache_path, 'w') as f:
+                f.write(text)
+    except (OSError, TypeError, ValueError):
+        pass  # Caching is best-effort (e.g. read-only config directory)
+    return config
+
+
+def parse_solver_parameters(overrides):
+    """
+    Validate CP-SAT parameter overrides and convert them to protobuf text format.
+    
+    Args:
+        overrides: dict of SatParameters field names to values; enums are
+                   given by name (e.g. search_branching: FIXED_SEARCH)
+    
+    Returns:
+        str: the parameters in text format, for solver.parameters.merge_text_format
+    
+    Raises:
+        ValueError: if a name or value is not a valid CP-SAT parameter
+    """
+    if not isinstance(overrides, dict):
+        raise ValueError(f"Invalid solver parameters: expected a mapping, got {overrides!r}")
+    try:
+        params = json_format.ParseDict(overrides, sat_parameters_pb2.SatParameters())
+    except json_format.ParseError as e:
+        # The first line names the offending field; the rest lists every field
+        raise ValueError(f"Invalid solver parameters: {str(e).splitlines()[0]}") from None
+    return text_format.MessageToString(params)
+
 
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    """Parse a YYYY-MM-DD string; cached since CSV rows repeat the same dates."""
+    return datetime.strptime(value, '%Y-%m-%d')
 
-def parse_availability_csv(csv_path, schedule_start_date, num_blocks=2, weeks_per_block=12):
+
+def parse_availability_csv(csv_path, schedule_start_date, num_blocks=2, weeks_per_block=12, engineers=None):
     """
     Parse availability CSV and convert to block/week constraints.
     
@@ -27,84 +123,130 @@ def parse_availability_csv(csv_path, schedule_start_date, num_blocks=2, weeks_pe
         schedule_start_date: first day of the schedule (can be any day of week)
         num_blocks: total number of blocks
         weeks_per_block: weeks per block
+        engineers: optional team; rows for anyone else are skipped
     
     Returns:
-        dict mapping (engineer, block, week) to False for unavailable periods
+        dict mapping block index to that block's {(engineer, week): False}
+        for unavailable periods, ready to pass as availability_overrides
     """
     if not os.path.exists(csv_path):
         return {}
     
-    constraints = {}
+    constraints = defaultdict(dict)
+    team = frozenset(engineers) if engineers is not None else None
     total_weeks = num_blocks * weeks_per_block
     
     with open(csv_path, 'r') as f:
         reader = csv.DictReader(f)
         for row in reader:
             engineer = row['engineer'].strip()
-            start = datetime.strptime(row['start_date'].strip(), '%Y-%m-%d')
-            end = datetime.strptime(row['end_date'].strip(), '%Y-%m-%d')
+            if team is not None and engineer not in team:
+                continue
+            start = parse_date(row['start_date'].strip())
+            end = parse_date(row['end_date'].strip())
             
-            # Find which weeks this date range overlaps
-            for week_idx in range(total_weeks):
-                week_start = schedule_start_date + timedelta(weeks=week_idx)
-                week_end = week_start + timedelta(days=6)
-                
-                # Check if unavailable period overlaps this week
-                if start <= week_end and end >= week_start:
-                    block = week_idx // weeks_per_block
-                    week_in_block = week_idx % weeks_per_block
-                    constraints[(engineer, block, week_in_block)] = False
+            # Weeks are contiguous 7-day spans from the schedule start, so the
+            # overlapping weeks are those containing the first and last day
+            first_week = max(0, (start - schedule_start_date).days // 7)
+            last_week = min(total_weeks - 1, (end - schedule_start_date).days // 7)
+            
+            for week_idx in range(first_week, last_week + 1):
+                block, week_in_block = divmod(week_idx, weeks_per_block)
+                constraints[block][(engineer, week_in_block)] = False
     
-    return constraints
+    return dict(constraints)
 
 
-def add_roster_completeness(model, x, engineers, roles, num_weeks):
+def add_roster_completeness(model, x):
     """C1: Each role must be filled exactly once per week."""
+    num_engineers, num_weeks, num_roles = x.shape
     for w in range(num_weeks):
-        for r in roles:
-            model.AddExactlyOne(x[(e, w, r)] for e in engineers)
+        for r in range(num_roles):
+            model.AddExactlyOne(x[:, w, r].tolist())
+    
+    # Redundant total demand; lets presolve weigh it against the workload limits
+    model.Add(cp_model.LinearExpr.Sum(x.ravel().tolist()) == num_weeks * num_roles)
 
 
-def add_no_consecutive_weeks(model, x, engineers, roles, num_weeks):
+def add_no_consecutive_weeks(model, work):
     """C2: An engineer cannot work in two consecutive weeks."""
-    for e in engineers:
+    num_engineers, num_weeks = work.shape
+    for e in range(num_engineers):
         for w in range(num_weeks - 1):
-            work_in_week_w = sum(x[(e, w, r)] for r in roles)
-            work_in_week_w1 = sum(x[(e, w + 1, r)] for r in roles)
-            model.Add(work_in_week_w + work_in_week_w1 <= 1)
-
-
-def add_max_workload(model, x, engineers, roles, num_weeks, max_shifts):
-    """C3: Each engineer works at most max_shifts in the period."""
-    for e in engineers:
-        total_shifts = sum(x[(e, w, r)] for w in range(num_weeks) for r in roles)
-        model.Add(total_shifts <= max_shifts)
-
-
-def add_weekend_limit(model, x, engineers, num_weeks, max_weekends, weekend_role):
-    """C4: Each engineer covers at most max_weekends in the weekend role."""
-    for e in engineers:
-        total_weekend_shifts = sum(x[(e, w, weekend_role)] for w in range(num_weeks))
-        model.Add(total_weekend_shifts <= max_weekends)
-
-
-def add_role_separation(model, x, engineers, roles, num_weeks):
+            model.AddAtMostOne(work[e, w], work[e, w + 1])
+
+
+def add_max_workload(model, shifts, max_shifts, block_weeks):
+    """C3: Each engineer works at most max_shifts per block of block_weeks weeks."""
+    # shifts is x, or work when an engineer holds at most one role per week
+    # (each week then counts once, with R times fewer terms)
+    num_engineers, num_weeks = shifts.shape[:2]
+    for e in range(num_engineers):
+        for first in range(0, num_weeks, block_weeks):
+            total_shifts = cp_model.LinearExpr.Sum(shifts[e, first:first + block_weeks].ravel().tolist())
+            model.Add(total_shifts <= max_shifts)
+
+
+def add_weekend_limit(model, x, max_weekends, weekend_r, block_weeks):
+    """C4: Each engineer covers at most max_weekends in the weekend role per block."""
+    num_engineers, num_weeks, _ = x.shape
+    for e in range(num_engineers):
+        for first in range(0, num_weeks, block_weeks):
+            weekend_shifts = x[e, first:first + block_weeks, weekend_r].tolist()
+            if max_weekends == 1:
+                model.AddAtMostOne(weekend_shifts)
+            else:
+                model.Add(cp_model.LinearExpr.Sum(weekend_shifts) <= max_weekends)
+
+
+def add_weekend_priority(model, x, weekend_r):
+    """Branch on weekend-role assignments first; C4 makes them the tightest choices."""
+    model.AddDecisionStrategy(
+        x[:, :, weekend_r].ravel().tolist(),
+        cp_model.CHOOSE_FIRST,
+        cp_model.SELECT_MIN_VALUE
+    )
+
+
+def add_role_separation(model, x, work):
     """C5: An engineer holds at most one role per week."""
-    for e in engineers:
+    num_engineers, num_weeks = work.shape
+    for e in range(num_engineers):
         for w in range(num_weeks):
-            model.Add(sum(x[(e, w, r)] for r in roles) <= 1)
+            # Exactly one of the roles or "off this week", which also ties work to x
+            model.AddExactlyOne(x[e, w].tolist() + [work[e, w].Not()])
 
 
-def add_availability(model, x, engineers, roles, num_weeks, availability):
-    """C6: An engineer can only be assigned if available."""
-    for e in engineers:
+def add_work_indicator(model, x, work):
+    """Tie work[e, w] to whether engineer e holds any role in week w."""
+    num_engineers, num_weeks = work.shape
+    for e in range(num_engineers):
         for w in range(num_weeks):
-            if not availability[(e, w)]:
-                for r in roles:
-                    model.Add(x[(e, w, r)] == 0)
+            model.AddMaxEquality(work[e, w], x[e, w].tolist())
+
+
+def add_symmetry_breaking(model, work, engineers, availability):
+    """Order engineers with identical availability by their first on-call week."""
+    num_weeks = work.shape[1]
+    
+    # Such engineers can swap schedules freely, so keep only one ordering
+    classes = defaultdict(list)
+    for e_idx in range(len(engineers)):
+        classes[availability[e_idx].tobytes()].append(e_idx)
+    
+    for members in classes.values():
+        first_week = {}
+        for e_idx in members:
+            # num_weeks if the engineer is never on call in this block
+            first_week[e_idx] = model.NewIntVar(0, num_weeks, f'first_week_{engineers[e_idx]}' if DEBUG_NAMES else '')
+            model.AddMinEquality(first_week[e_idx], [
+                num_weeks - (num_weeks - w) * work[e_idx, w] for w in range(num_weeks)
+            ])
+        for e_i, e_j in zip(members, members[1:]):
+            model.Add(first_week[e_i] <= first_week[e_j])
 
 
-def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_shifts=3, max_weekends=1, weekend_role='NP', solver_timeout=60.0, availability_overrides=None, active_rules=None, print_output=True):
+def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_shifts=3, max_weekends=1, weekend_role='NP', solver_timeout=60.0, availability_overrides=None, active_rules=None, hint_schedule=None, forbidden_week0=None, weeks_per_block=None, solver_params=None, print_output=True):
     """
     Generates and prints an on-call schedule.
     
@@ -113,12 +255,17 @@ def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_sh
         roles: list of role codes (e.g., ['D', 'NP', 'NS'])
         start_date: datetime object for first day (can be any day of week)
         num_weeks: number of weeks in the schedule block
-        max_shifts: maximum shifts per engineer in the period
-        max_weekends: maximum weekend shifts per engineer
+        max_shifts: maximum shifts per engineer in each block
+        max_weekends: maximum weekend shifts per engineer in each block
         weekend_role: which role represents weekend coverage
         solver_timeout: maximum solver time in seconds
         availability_overrides: dict mapping (engineer, week) to False for unavailable weeks
         active_rules: dict of rule names to bool (which constraints to apply)
+        hint_schedule: optional schedule[week][role] = engineer used to warm-start the solver
+        forbidden_week0: engineers who cannot work week 0 (on call just before this block)
+        weeks_per_block: split num_weeks into blocks of this size for the per-block
+                         limits and printing (default: a single block)
+        solver_params: dict of CP-SAT parameters overriding SOLVER_PARAMETERS
         print_output: whether to print the schedule (default: True)
     
     Returns:
@@ -128,17 +275,38 @@ def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_sh
     # 1. INPUTS
     # =================================================================
     num_engineers = len(engineers)
+    num_roles = len(roles)
+    block_weeks = weeks_per_block or num_weeks
+    num_blocks = -(-num_weeks // block_weeks)
 
-    # Availability: True if available, False if not.
-    availability = {}
-    for e in engineers:
-        for w in range(num_weeks):
-            availability[(e, w)] = True
+    eng_idx = {e: e_idx for e_idx, e in enumerate(engineers)}
+    role_idx = {r: r_idx for r_idx, r in enumerate(roles)}
+
+    # Availability: availability[eng_idx[e], w] is True if available, False if not.
+    availability = np.ones((num_engineers, num_weeks), dtype=bool)
     
-    # Apply overrides if provided
+    # Apply overrides if provided (ignoring names that are not on the team)
     if availability_overrides:
         for (e, w), is_available in availability_overrides.items():
-            availability[(e, w)] = is_available
+            if e in eng_idx:
+                availability[eng_idx[e], w] = is_available
+    
+    # Block boundary: engineers who just finished a week cannot start this one
+    if forbidden_week0:
+        availability[[eng_idx[e] for e in forbidden_week0 if e in eng_idx], 0] = False
+    
+    # Default: all rules active if not specified
+    if active_rules is None:
+        active_rules = {
+            'roster_completeness': True,
+            'no_consecutive_weeks': True,
+            'max_workload': True,
+            'weekend_limit': True,
+            'role_separation': True,
+            'availability': True,
+            'weekend_priority': False,
+            'symmetry_breaking': True
+        }
 
 
     # =================================================================
@@ -146,51 +314,77 @@ def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_sh
     # =================================================================
     model = cp_model.CpModel()
 
-    # Create the x_{e,w,r} variables.
-    # x[(e, w, r)] is 1 if engineer e is assigned role r in week w, and 0 otherwise.
-    x = {}
-    for e in engineers:
-        for w in range(num_weeks):
-            for r in roles:
-                x[(e, w, r)] = model.NewBoolVar(f'x_{e}_{w}_{r}')
+    # Create the x_{e,w,r} variables as an (engineers, weeks, roles) object array.
+    # x[e, w, r] is 1 if engineer e is assigned role r in week w, and 0 otherwise.
+    # C6: when availability is enforced, unavailable slots are the constant 0
+    # rather than a variable the solver would have to eliminate.
+    if active_rules.get('availability', False):
+        assignable = availability
+    else:
+        assignable = np.ones_like(availability)
+    zero = model.NewConstant(0)
+    x = np.full((num_engineers, num_weeks, num_roles), zero, dtype=object)
+    
+    # work[e, w] is 1 if engineer e is on call (in any role) in week w.
+    work = np.full((num_engineers, num_weeks), zero, dtype=object)
+    
+    for e_idx, w in np.argwhere(assignable):
+        e = engineers[e_idx]
+        for r_idx, r in enumerate(roles):
+            x[e_idx, w, r_idx] = model.NewBoolVar(f'x_{e}_{w}_{r}' if DEBUG_NAMES else '')
+        work[e_idx, w] = model.NewBoolVar(f'work_{e}_{w}' if DEBUG_NAMES else '')
 
 
     # =================================================================
     # 3. ADDING CONSTRAINTS
     # =================================================================
     
-    # Default: all rules active if not specified
-    if active_rules is None:
-        active_rules = {
-            'roster_completeness': True,
-            'no_consecutive_weeks': True,
-            'max_workload': True,
-            'weekend_limit': True,
-            'role_separation': True,
-            'availability': True
-        }
+    # Channel work to x. With two or more weeks C2 limits each engineer to one
+    # role per week as well, so C5's exactly-one channel serves both; otherwise
+    # work is the OR of roles (a single week has no pair for C2 to constrain).
+    one_role_per_week = bool(
+        active_rules.get('role_separation')
+        or (active_rules.get('no_consecutive_weeks') and num_weeks > 1)
+    )
+    if one_role_per_week:
+        add_role_separation(model, x, work)
+    else:
+        add_work_indicator(model, x, work)
     
     # Rule dispatch table
     rule_functions = {
-        'roster_completeness': lambda: add_roster_completeness(model, x, engineers, roles, num_weeks),
-        'no_consecutive_weeks': lambda: add_no_consecutive_weeks(model, x, engineers, roles, num_weeks),
-        'max_workload': lambda: add_max_workload(model, x, engineers, roles, num_weeks, max_shifts),
-        'weekend_limit': lambda: add_weekend_limit(model, x, engineers, num_weeks, max_weekends, weekend_role),
-        'role_separation': lambda: add_role_separation(model, x, engineers, roles, num_weeks),
-        'availability': lambda: add_availability(model, x, engineers, roles, num_weeks, availability)
+        'roster_completeness': lambda: add_roster_completeness(model, x),
+        'no_consecutive_weeks': lambda: add_no_consecutive_weeks(model, work),
+        'max_workload': lambda: add_max_workload(model, work if one_role_per_week else x, max_shifts, block_weeks),
+        'weekend_limit': lambda: add_weekend_limit(model, x, max_weekends, role_idx[weekend_role], block_weeks),
+        'weekend_priority': lambda: add_weekend_priority(model, x, role_idx[weekend_role])
     }
-    
+
     # Apply active rules
     for rule_name, is_active in active_rules.items():
         if is_active and rule_name in rule_functions:
             rule_functions[rule_name]()
+    
+    # Prune solutions that only differ by swapping interchangeable engineers.
+    # A pure search aid, so it stays on unless the rules turn it off explicitly.
+    if active_rules.get('symmetry_breaking', True):
+        add_symmetry_breaking(model, work, engineers, availability)
 
 
     # =================================================================
     # 4. SOLVE
     # =================================================================
+    # Seed the search with a previous solution; hints are advisory only
+    if hint_schedule:
+        for w, assignments in hint_schedule.items():
+            for r, e in assignments.items():
+                e_idx = eng_idx.get(e)
+                if e_idx is not None and w < num_weeks and r in role_idx and availability[e_idx, w]:
+                    model.AddHint(x[e_idx, w, role_idx[r]], 1)
+    
     solver = cp_model.CpSolver()
     solver.parameters.max_time_in_seconds = solver_timeout
+    solver.parameters.merge_text_format(parse_solver_parameters({**SOLVER_PARAMETERS, **(solver_params or {})}))
     status = solver.Solve(model)
 
 
@@ -202,25 +396,32 @@ def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_sh
         schedule = {}
         for w in range(num_weeks):
             schedule[w] = {}
-            for r in roles:
-                for e in engineers:
-                    if solver.Value(x[(e, w, r)]) == 1:
-                        schedule[w][r] = e
+            # Only assignable engineers can hold a role; C1 fills each role once
+            candidates = np.flatnonzero(assignable[:, w])
+            for r_idx, r in enumerate(roles):
+                for e_idx in candidates:
+                    if solver.BooleanValue(x[e_idx, w, r_idx]):
+                        schedule[w][r] = engineers[e_idx]
+                        break
         
         if print_output:
             print("✅ Feasible schedule found!\n")
-            # Print the formatted schedule
+            # Print the formatted schedule, one table per block
             role_columns = ' | '.join([f"{r:<10}" for r in roles])
             header = f"{'Week':<6} | {'Dates':<13} | {role_columns}"
-            print(header)
-            print("-" * len(header))
             
-            for w in range(num_weeks):
-                week_start = start_date + timedelta(weeks=w)
-                week_end = week_start + timedelta(days=6)
-                date_range = f"{week_start.strftime('%b %d')}-{week_end.strftime('%d')}"
-                role_values = ' | '.join([f"{schedule[w][r]:<10}" for r in roles])
-                print(f"{(w+1):<6} | {date_range:<13} | {role_values}")
+            for first in range(0, num_weeks, block_weeks):
+                if num_blocks > 1:
+                    print_block_header(first // block_weeks, block_weeks)
+                print(header)
+                print("-" * len(header))
+                
+                for w in range(first, min(first + block_weeks, num_weeks)):
+                    week_start = start_date + timedelta(weeks=w)
+                    week_end = week_start + timedelta(days=6)
+                    date_range = f"{week_start.strftime('%b %d')}-{week_end.strftime('%d')}"
+                    role_values = ' | '.join([f"{schedule[w][r]:<10}" for r in roles])
+                    print(f"{(w - first + 1):<6} | {date_range:<13} | {role_values}")
         
         return schedule
 
@@ -235,13 +436,13 @@ def generate_on_call_schedule(engineers, roles, start_date, num_weeks=12, max_sh
             print("\n💡 Suggestions:")
             
             # Count unavailable slots
-            unavailable_count = sum(1 for (e, w) in availability if not availability[(e, w)])
+            unavailable_count = int((~availability).sum())
             print(f"   - Current unavailable slots: {unavailable_count}")
-            print(f"   - Total capacity: {num_engineers * max_shifts} person-shifts (max)")
+            print(f"   - Total capacity: {num_engineers * max_shifts * num_blocks} person-shifts (max)")
             print(f"   - Required capacity: {num_weeks * len(roles)} person-shifts")
             print(f"   - Note: No-consecutive-weeks constraint further limits capacity")
             
-            if (num_engineers * max_shifts - unavailable_count) < (num_weeks * len(roles)):
+            if (num_engineers * max_shifts * num_blocks - unavailable_count) < (num_weeks * len(roles)):
                 print("   ⚠️  Insufficient capacity! Need to reduce absences or add engineers.")
         
         return None
@@ -268,65 +469,67 @@ def generate_shift_events(schedules, start_date, roles, role_definitions, weeks_
     # Calculate what weekday the start_date actually is
     start_weekday = start_date.weekday()  # 0=Monday, 6=Sunday
     
+    # Parse each role's shift definitions once, flattened to one entry per day:
+    # (day_name, day_offset, start_hour, start_min, end_offset, end_hour, end_min)
+    # where end_offset is the number of days from the shift's start to its end
+    role_shifts = []
+    for role in roles:
+        role_def = role_definitions[role]
+        shifts = []
+        for block in role_def.get('schedule', []):
+            start_hour, start_min = map(int, block['start_time'].split(':'))
+            end_hour, end_min = map(int, block['end_time'].split(':'))
+            span_days = block.get('span_days', 1)
+            
+            if span_days > 1:
+                # Multi-day event (e.g., Fri 17:00 -> Mon 09:00)
+                end_offset = span_days
+            elif end_hour < start_hour or (end_hour == start_hour and end_min < start_min):
+                # Overnight event (e.g., 17:00 -> 09:00 next day)
+                end_offset = 1
+            else:
+                # Same day event
+                end_offset = 0
+            
+            for day_name in block['days']:
+                # How many days forward from week_start to reach the target weekday?
+                # If week starts on Wed (3) and we want Mon (0), that's (0 - 3) % 7 = 4 days forward
+                day_offset = (day_map[day_name] - start_weekday) % 7
+                shifts.append((day_name, day_offset, start_hour, start_min, end_offset, end_hour, end_min))
+        role_shifts.append((role, role_def.get('name', role), shifts))
+    
+    # Work in day ordinals and build each datetime directly from its date
+    start_ordinal = start_date.toordinal()
+    fromordinal = date.fromordinal
+    
     for block_idx, schedule in enumerate(schedules):
         for week in sorted(schedule.keys()):
             abs_week = block_idx * weeks_per_block + week + 1
-            week_start = start_date + timedelta(weeks=block_idx * weeks_per_block + week)
+            week_ordinal = start_ordinal + 7 * (block_idx * weeks_per_block + week)
             
-            for role in roles:
+            for role, role_name, shifts in role_shifts:
                 engineer = schedule[week][role]
-                role_def = role_definitions[role]
-                role_name = role_def.get('name', role)
-                schedule_blocks = role_def.get('schedule', [])
                 
-                for block in schedule_blocks:
-                    days = block['days']
-                    start_time = block['start_time']
-                    end_time = block['end_time']
-                    span_days = block.get('span_days', 1)
+                for day_name, day_offset, start_hour, start_min, end_offset, end_hour, end_min in shifts:
+                    start_day = fromordinal(week_ordinal + day_offset)
+                    end_day = fromordinal(week_ordinal + day_offset + end_offset) if end_offset else start_day
+                    event_start = datetime(start_day.year, start_day.month, start_day.day, start_hour, start_min)
+                    event_end = datetime(end_day.year, end_day.month, end_day.day, end_hour, end_min)
                     
-                    for day_name in days:
-                        # Calculate actual day offset from week start
-                        target_weekday = day_map[day_name]
-                        # How many days forward from week_start to reach target weekday?
-                        # If week starts on Wed (3) and we want Mon (0), that's (0 - 3) % 7 = 4 days forward
-                        day_offset = (target_weekday - start_weekday) % 7
-                        event_start_date = week_start + timedelta(days=day_offset)
-                        
-                        # Parse times
-                        start_hour, start_min = map(int, start_time.split(':'))
-                        end_hour, end_min = map(int, end_time.split(':'))
-                        
-                        # Create start datetime
-                        event_start = event_start_date.replace(hour=start_hour, minute=start_min)
-                        
-                        # Calculate end datetime
-                        if span_days > 1:
-                            # Multi-day event (e.g., Fri 17:00 -> Mon 09:00)
-                            event_end = event_start + timedelta(days=span_days, hours=0, minutes=0)
-                            event_end = event_end.replace(hour=end_hour, minute=end_min)
-                        elif end_hour < start_hour or (end_hour == start_hour and end_min < start_min):
-                            # Overnight event (e.g., 17:00 -> 09:00 next day)
-                            event_end = event_start + timedelta(days=1)
-                            event_end = event_end.replace(hour=end_hour, minute=end_min)
-                        else:
-                            # Same day event
-                            event_end = event_start.replace(hour=end_hour, minute=end_min)
-                        
-                        yield {
-                            'block_idx': block_idx,
-                            'week': week,
-                            'abs_week': abs_week,
-                            'role': role,
-                            'role_name': role_name,
-                            'engineer': engineer,
-                            'day_name': day_name,
-                            'event_start': event_start,
-                            'event_end': event_end
-                        }
-
-
-def export_schedule_csv(schedules, start_date, roles, role_definitions, weeks_per_block=12, output_path='schedule.csv'):
+                    yield {
+                        'block_idx': block_idx,
+                        'week': week,
+                        'abs_week': abs_week,
+                        'role': role,
+                        'role_name': role_name,
+                        'engineer': engineer,
+                        'day_name': day_name,
+                        'event_start': event_start,
+                        'event_end': event_end
+                    }
+
+
+def export_schedule_csv(schedules, start_date, roles, role_definitions, weeks_per_block=12, output_path='schedule.csv', events=None):
     """
     Export schedule to CSV format with detailed time information.
     
@@ -337,24 +540,37 @@ def export_schedule_csv(schedules, start_date, roles, role_definitions, weeks_pe
         role_definitions: dict with role schedules
         weeks_per_block: weeks per block
         output_path: path to output CSV file
+        events: optional shift events already generated from the schedules
     """
-    with open(output_path, 'w', newline='') as f:
+    if events is None:
+        events = generate_shift_events(schedules, start_date, roles, role_definitions, weeks_per_block)
+    
+    # Shifts hand over at shared instants (one ends as the next starts),
+    # so format each distinct timestamp only once, as '%Y-%m-%d %H:%M'
+    format_time = lru_cache(maxsize=None)(
+        lambda dt: f'{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}'
+    )
+    
+    rows = [
+        [
+            event['abs_week'],
+            event['role_name'],
+            event['engineer'],
+            format_time(event['event_start']),
+            format_time(event['event_end'])
+        ]
+        for event in events
+    ]
+    
+    with open(output_path, 'w', newline='', buffering=1 << 20) as f:
         writer = csv.writer(f)
         writer.writerow(['Week', 'Role', 'Engineer', 'Start DateTime', 'End DateTime'])
-        
-        for event in generate_shift_events(schedules, start_date, roles, role_definitions, weeks_per_block):
-            writer.writerow([
-                event['abs_week'],
-                event['role_name'],
-                event['engineer'],
-                event['event_start'].strftime('%Y-%m-%d %H:%M'),
-                event['event_end'].strftime('%Y-%m-%d %H:%M')
-            ])
+        writer.writerows(rows)
     
     print(f"📄 Schedule exported to {output_path}")
 
 
-def export_schedule_ical(schedules, start_date, roles, role_definitions, timezone='UTC', weeks_per_block=12, output_path='schedule.ics'):
+def export_schedule_ical(schedules, start_date, roles, role_definitions, timezone='UTC', weeks_per_block=12, output_path='schedule.ics', events=None):
     """
     Export schedule to iCal format for calendar import with timed events.
     
@@ -366,8 +582,9 @@ def export_schedule_ical(schedules, start_date, roles, role_definitions, timezon
         timezone: timezone string
         weeks_per_block: weeks per block
         output_path: path to output ICS file
+        events: optional shift events already generated from the schedules
     """
-    lines = [
+    header = '\r\n'.join([
         'BEGIN:VCALENDAR',
         'VERSION:2.0',
         'PRODID:-//On-Call Schedule//EN',
@@ -375,28 +592,132 @@ def export_schedule_ical(schedules, start_date, roles, role_definitions, timezon
         'METHOD:PUBLISH',
         'X-WR-CALNAME:On-Call Schedule',
         f'X-WR-TIMEZONE:{timezone}',
-    ]
+    ])
+    
+    if events is None:
+        events = generate_shift_events(schedules, start_date, roles, role_definitions, weeks_per_block)
+    # Same as strftime('%Y%m%dT%H%M%S') without its per-call format parsing
+    format_time = lru_cache(maxsize=None)(
+        lambda dt: f'{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}'
+    )
+    
+    # newline='' keeps the CRLF line endings required by iCalendar intact
+    with open(output_path, 'w', newline='', buffering=1 << 20) as f:
+        f.write(header)
+        f.writelines(
+            VEVENT_TEMPLATE.format_map({
+                **event,
+                'start_str': format_time(event['event_start']),
+                'end_str': format_time(event['event_end']),
+            })
+            for event in events
+        )
+        f.write('\r\nEND:VCALENDAR')
     
-    for event in generate_shift_events(schedules, start_date, roles, role_definitions, weeks_per_block):
-        start_str = event['event_start'].strftime('%Y%m%dT%H%M%S')
-        end_str = event['event_end'].strftime('%Y%m%dT%H%M%S')
-        
-        lines.extend([
-            'BEGIN:VEVENT',
-            f'DTSTART:{start_str}',
-            f'DTEND:{end_str}',
-            f'SUMMARY:On-Call: {event["engineer"]} ({event["role_name"]})',
-            f'DESCRIPTION:Engineer: {event["engineer"]}\\nRole: {event["role_name"]}',
-            f'UID:{event["block_idx"]}-{event["week"]}-{event["role"]}-{event["day_name"]}@oncall',
-            'END:VEVENT',
-        ])
+    print(f"📅 Schedule exported to {output_path}")
+
+
+def export_schedules(schedules, start_date, roles, role_definitions, timezone, weeks_per_block, export_formats):
+    """Export the schedules in each requested format ('csv', 'ical')."""
+    if not export_formats or not schedules:
+        return
     
-    lines.append('END:VCALENDAR')
+    print(f"\n{SEPARATOR}")
+    print("EXPORTING SCHEDULE")
+    print(f"{SEPARATOR}\n")
     
-    with open(output_path, 'w') as f:
-        f.write('\r\n'.join(lines))
+    # Generate the shift events once and share them between the formats
+    events = list(generate_shift_events(schedules, start_date, roles, role_definitions, weeks_per_block))
     
-    print(f"📅 Schedule exported to {output_path}")
+    if 'csv' in export_formats:
+        export_schedule_csv(schedules, start_date, roles, role_definitions, weeks_per_block, events=events)
+    if 'ical' in export_formats:
+        export_schedule_ical(schedules, start_date, roles, role_definitions, timezone, weeks_per_block, events=events)
+
+
+def print_block_header(block_idx, weeks_per_block):
+    """Print the banner that introduces a block's schedule."""
+    print(f"\n{SEPARATOR}")
+    print(f"BLOCK {block_idx + 1} (Weeks {block_idx*weeks_per_block + 1}-{(block_idx+1)*weeks_per_block})")
+    print(f"{SEPARATOR}\n")
+
+
+def solve_block_captured(block_args):
+    """
+    Solve one block and capture what it prints, for use in worker processes.
+    
+    Args:
+        block_args: keyword arguments for generate_on_call_schedule
+    
+    Returns:
+        tuple of (schedule or None, printed output)
+    """
+    output = io.StringIO()
+    with redirect_stdout(output):
+        schedule = generate_on_call_schedule(**block_args, print_output=True)
+    return schedule, output.getvalue()
+
+
+def generate_joint_schedule(engineers, roles, start_date, num_blocks, weeks_per_block, max_shifts, max_weekends, weekend_role, solver_timeout, availability_overrides=None, active_rules=None, solver_params=None):
+    """
+    Generates all blocks at once as a single model.
+    
+    C2 spans block boundaries directly instead of being stitched together
+    from the previous block's last week, and C3/C4 still apply per block.
+    
+    Args:
+        engineers: list of engineer names
+        roles: list of role codes
+        start_date: datetime object for the first day of the first block
+        num_blocks: number of blocks
+        weeks_per_block: weeks per block
+        max_shifts: maximum shifts per engineer per block
+        max_weekends: maximum weekend shifts per engineer per block
+        weekend_role: which role represents weekend coverage
+        solver_timeout: maximum solver time in seconds
+        availability_overrides: dict mapping block index to {(engineer, week): availability}
+        active_rules: dict of rule names to bool (which constraints to apply)
+        solver_params: dict of CP-SAT parameters overriding SOLVER_PARAMETERS
+    
+    Returns:
+        list of schedule dicts, one per block, or None if no solution found
+    """
+    print(f"\n{SEPARATOR}")
+    print(f"ALL BLOCKS (Weeks 1-{num_blocks * weeks_per_block}, joint model)")
+    print(f"{SEPARATOR}\n")
+    
+    # Convert per-block (engineer, week) overrides to absolute weeks
+    overrides = {}
+    if availability_overrides:
+        for b, block_overrides in availability_overrides.items():
+            if b < num_blocks:
+                for (e, w), available in block_overrides.items():
+                    overrides[(e, b * weeks_per_block + w)] = available
+    
+    schedule = generate_on_call_schedule(
+        engineers=engineers,
+        roles=roles,
+        start_date=start_date,
+        num_weeks=num_blocks * weeks_per_block,
+        max_shifts=max_shifts,
+        max_weekends=max_weekends,
+        weekend_role=weekend_role,
+        solver_timeout=solver_timeout,
+        availability_overrides=overrides,
+        active_rules=active_rules,
+        weeks_per_block=weeks_per_block,
+        solver_params=solver_params,
+        print_output=True
+    )
+    
+    if schedule is None:
+        return None
+    
+    # Slice the joint schedule back into per-block schedules
+    return [
+        {w: schedule[b * weeks_per_block + w] for w in range(weeks_per_block)}
+        for b in range(num_blocks)
+    ]
 
 
 def generate_multi_block_schedule(config):
@@ -410,9 +731,9 @@ def generate_multi_block_schedule(config):
         list of schedule dicts, one per block
     """
     # Extract config values
-    engineers = config['team']
+    engineers = tuple(config['team'])
     roles_config = config['roles']
-    roles = list(roles_config.keys())
+    roles = tuple(roles_config.keys())
     role_definitions = roles_config
     
     start_date = datetime.strptime(config['schedule']['start_date'], '%Y-%m-%d')
@@ -423,82 +744,137 @@ def generate_multi_block_schedule(config):
     max_weekends = config['constraints']['max_weekends_per_engineer']
     weekend_role = config['constraints'].get('weekend_role', 'NP')  # Default to 'NP'
     solver_timeout = config.get('solver', {}).get('timeout_seconds', 60.0)  # Default to 60
+    joint_solve = config.get('solver', {}).get('joint_solve', False)  # Default to per-block
+    solver_params = config.get('solver', {}).get('parameters', None)  # Optional CP-SAT overrides
+    num_workers = config.get('solver', {}).get('num_workers', None)  # Default to SOLVER_PARAMETERS
+    use_hints = config.get('solver', {}).get('use_hints', True)  # Warm-start blocks from related solutions
+    parallel_blocks = config.get('solver', {}).get('parallel_blocks', False)  # Default to one block at a time
+    
+    if num_workers:
+        solver_params = {**(solver_params or {}), 'num_search_workers': num_workers}
+    
+    # Reject bad parameters up front rather than in the middle of a solve
+    try:
+        parse_solver_parameters(solver_params or {})
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return None
+    
     availability_csv = config['files']['availability_csv']
     export_formats = config['files']['export_formats']
     active_rules = config.get('rules', None)  # Optional rules section
     
-    availability_overrides = None
-    
-    # Parse CSV if provided and merge with overrides
+    # Unavailability from the CSV, already bucketed by block
+    availability_overrides = {}
     if availability_csv:
-        csv_constraints = parse_availability_csv(availability_csv, start_date, num_blocks, weeks_per_block)
-        if availability_overrides:
-            csv_constraints.update(availability_overrides)
-        availability_overrides = csv_constraints
-    
-    schedules = []
-    boundary_constraints = {}
+        availability_overrides = parse_availability_csv(availability_csv, start_date, num_blocks, weeks_per_block, engineers)
     
-    for block_idx in range(num_blocks):
-        print(f"\n{SEPARATOR}")
-        print(f"BLOCK {block_idx + 1} (Weeks {block_idx*weeks_per_block + 1}-{(block_idx+1)*weeks_per_block})")
-        print(f"{SEPARATOR}\n")
-        
-        # Calculate start date for this block
-        block_start = start_date + timedelta(weeks=weeks_per_block * block_idx)
-        
-        # Merge availability: user overrides + boundary constraints
-        block_availability = {}
-        if availability_overrides:
-            for (e, b, w), available in availability_overrides.items():
-                if b == block_idx:
-                    block_availability[(e, w)] = available
-        
-        # Add boundary constraint from previous block
-        block_availability.update(boundary_constraints)
-        
-        # Generate schedule for this block
-        schedule = generate_on_call_schedule(
-            engineers=engineers,
-            roles=roles,
-            start_date=block_start,
-            num_weeks=weeks_per_block,
-            max_shifts=max_shifts,
-            max_weekends=max_weekends,
-            weekend_role=weekend_role,
-            solver_timeout=solver_timeout,
-            availability_overrides=block_availability if block_availability else None,
+    if joint_solve:
+        schedules = generate_joint_schedule(
+            engineers, roles, start_date, num_blocks, weeks_per_block,
+            max_shifts, max_weekends, weekend_role, solver_timeout,
+            availability_overrides=availability_overrides,
             active_rules=active_rules,
-            print_output=True
+            solver_params=solver_params
         )
         
-        if schedule is None:
-            print(f"\n❌ Failed to generate schedule for block {block_idx + 1}")
+        if schedules is None:
+            print("\n❌ Failed to generate joint schedule")
             return None
         
-        schedules.append(schedule)
+        export_schedules(schedules, start_date, roles, role_definitions, timezone, weeks_per_block, export_formats)
+        return schedules
+    
+    # Per-block solver arguments; availability holds this block's overrides
+    block_args = []
+    for block_idx in range(num_blocks):
+        block_args.append({
+            'engineers': engineers,
+            'roles': roles,
+            'start_date': start_date + timedelta(weeks=weeks_per_block * block_idx),
+            'num_weeks': weeks_per_block,
+            'max_shifts': max_shifts,
+            'max_weekends': max_weekends,
+            'weekend_role': weekend_role,
+            'solver_timeout': solver_timeout,
+            'availability_overrides': availability_overrides.get(block_idx, {}),
+            'active_rules': active_rules,
+            # Vary the seed between blocks (a configured seed wins). Runs are not
+            # reproducible: with several workers the first to finish decides.
+            'solver_params': {'random_seed': block_idx, **(solver_params or {})},
+        })
+    
+    # Blocks are only coupled through the no_consecutive_weeks boundary
+    link_blocks = bool(active_rules and active_rules.get('no_consecutive_weeks', True))
+    
+    schedules = []
+    processes = min(num_blocks, os.cpu_count() or 1)
+    
+    if parallel_blocks and processes > 1:
+        # Solve all blocks concurrently in worker processes, speculatively
+        # ignoring the boundary. Blocks that clash with their predecessor are
+        # re-solved, which can cost more than solving one block at a time.
+        # Split the cores between processes unless the worker count is configured
+        pool_args = block_args
+        if 'num_search_workers' not in (solver_params or {}):
+            workers_per_process = max(1, (os.cpu_count() or 1) // processes)
+            pool_args = [
+                {**args, 'solver_params': {**args['solver_params'], 'num_search_workers': workers_per_process}}
+                for args in block_args
+            ]
         
-        # Extract last week engineers for next block's boundary
-        # Only apply if no_consecutive_weeks rule is active
-        if block_idx < num_blocks - 1:
-            boundary_constraints = {}
-            if active_rules and active_rules.get('no_consecutive_weeks', True):
-                last_week = weeks_per_block - 1  # 0-indexed
-                for role in roles:
-                    engineer = schedule[last_week][role]
-                    boundary_constraints[(engineer, 0)] = False  # Block next week 0
-    
-    # Export if requested
-    if export_formats and schedules:
-        print(f"\n{SEPARATOR}")
-        print("EXPORTING SCHEDULE")
-        print(f"{SEPARATOR}\n")
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(solve_block_captured, pool_args))
+        
+        for block_idx, (schedule, output) in enumerate(results):
+            print_block_header(block_idx, weeks_per_block)
+            
+            # Re-solve a block whose first week clashes with the accepted
+            # previous block; its speculative schedule is a good warm start
+            if link_blocks and schedules and schedule is not None:
+                boundary_engineers = frozenset(schedules[-1][weeks_per_block - 1].values())
+                if boundary_engineers & set(schedule[0].values()):
+                    schedule, output = solve_block_captured({
+                        **block_args[block_idx],
+                        'hint_schedule': schedule if use_hints else None,
+                        'forbidden_week0': boundary_engineers,
+                    })
+            
+            print(output, end='')
+            
+            if schedule is None:
+                print(f"\n❌ Failed to generate schedule for block {block_idx + 1}")
+                return None
+            
+            schedules.append(schedule)
+    else:
+        boundary_engineers = frozenset()
         
-        if 'csv' in export_formats:
-            export_schedule_csv(schedules, start_date, roles, role_definitions, weeks_per_block)
-        if 'ical' in export_formats:
-            export_schedule_ical(schedules, start_date, roles, role_definitions, timezone, weeks_per_block)
+        for block_idx, args in enumerate(block_args):
+            print_block_header(block_idx, weeks_per_block)
+            
+            # Generate schedule for this block
+            # Warm-start from the previous block, which has the same structure
+            schedule = generate_on_call_schedule(
+                **args,
+                hint_schedule=schedules[-1] if schedules and use_hints else None,
+                forbidden_week0=boundary_engineers,
+                print_output=True
+            )
+            
+            if schedule is None:
+                print(f"\n❌ Failed to generate schedule for block {block_idx + 1}")
+                return None
+            
+            schedules.append(schedule)
+            
+            # Extract last week engineers for next block's boundary
+            # Only apply if no_consecutive_weeks rule is active
+            if link_blocks and block_idx < num_blocks - 1:
+                last_week = weeks_per_block - 1  # 0-indexed
+                boundary_engineers = frozenset(schedule[last_week][role] for role in roles)
     
+    export_schedules(schedules, start_date, roles, role_definitions, timezone, weeks_per_block, export_formats)
     return schedules
 
 